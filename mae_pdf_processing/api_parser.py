@@ -2,27 +2,110 @@ import re
 from typing import Callable
 
 import fitz
+import numpy as np
 import pandas as pd
 
 
-COMMON_STRINGS_TO_REMOVE = [
-    "URUSNIAGA AKAUN/ 戶口進支項 /ACCOUNT TRANSACTIONS",
+# Transaction table headers (Malay and Chinese) shared by the noise lists below.
+STATEMENT_HEADER_STRINGS = [
     "TARIKH MASUK",
+    "TARIKH NILAI",
     "BUTIR URUSNIAGA",
     "JUMLAH URUSNIAGA",
     "BAKI PENYATA",
     "進支日期",
+    "仄過賬日期",
     "進支項說明",
     "银碼",
     "結單存餘",
+]
+
+COMMON_STRINGS_TO_REMOVE = [
+    "URUSNIAGA AKAUN/ 戶口進支項 /ACCOUNT TRANSACTIONS",
     "URUSNIAGA AKAUN/ 戶口進支項/ACCOUNT TRANSACTIONS",
-    "TARIKH NILAI",
-    "仄過賬日期",
+    *STATEMENT_HEADER_STRINGS,
     "戶號",
 ]
 
+M2U_STRINGS_TO_REMOVE = [
+    "URUSNIAGA AKAUN/",
+    "戶口進支項",
+    "/ACCOUNT TRANSACTIONS",
+    *STATEMENT_HEADER_STRINGS,
+    "BEGINNING BALANCE",
+]
+
 
-def _read_pdf_text(pdf_bytes: bytes) -> str:
+_REMOVE_RE = re.compile("|".join(re.escape(s) for s in COMMON_STRINGS_TO_REMOVE))
+_M2U_REMOVE_RE = re.compile("|".join(re.escape(s) for s in M2U_STRINGS_TO_REMOVE))
+_DATE_DDMMYY = re.compile(r"\d{2}/\d{2}/\d{2}")
+_DATE_DDMM = re.compile(r"\d{2}/\d{2}")
+_DATE_DDMMYYYY = re.compile(r"\d{2}/\d{2}/\d{4}")
+_FILENAME_YEAR = re.compile(r"(\d{4})(?=\d{2})")
+_FOUR_DIGITS = re.compile(r"\d{4}")
+_AMOUNT_RE = re.compile(r"(\d{1,3}(?:,\d{3})*(?:\.\d{2})?[+-]?|\d+(?:\.\d{2})?[+-]?)")
+_CLEAN_AMOUNT_RE = re.compile(r"[^\d.,+-]")
+_NON_DIGIT_DOT = re.compile(r"[^\d.]")
+_LEADING_NUMBER = re.compile(r"^-?\d")
+_MBB_CREDIT_AMOUNT = re.compile(r"^(\d{1,3}(?:,\d{3})*(\.\d{2})?)(CR)?$", re.IGNORECASE)
+_RHB_DATE = re.compile(r"(\d{2}-\d{2}-\d{4}|\d{2}-\d{2}-\d{2})")
+_RHB_AMOUNT = re.compile(r"([\d,]+\.\d{2})\s*(DR|CR|\+|\-)?$")
+_RHB_BALANCE = re.compile(r"^([\d,]+\.\d{2}\+)\s*(.*)")
+_HAS_LETTER = re.compile(r"[A-Za-z]")
+_HAS_DIGIT = re.compile(r"\d")
+_THREE_DIGITS = re.compile(r"^\d{3}$")
+_LONG_DIGITS = re.compile(r"^\d{8,}$")
+_UNWANTED_UNION = re.compile(
+    "|".join(
+        f"(?:{p})"
+        for p in [
+            r"06/\s*\d+\s*/\s*-\s*",
+            r"/\s*\d{3,}\s*/\s*-\s*",
+            r"www\.rhbgroup\.com.*",
+            r"For Any Enquiries.*",
+            r"Date Branch Description.*",
+            r"Reference 1 / Recipient's Reference.*",
+            r"Reference 2 / Other Payment Details.*",
+            r"RefNum.*",
+            r"Amount \(DR\).*",
+            r"Amount \(CR\).*",
+            r"Balance Sender's / Beneficiary's Name.*",
+            r"Sender's / Beneficiary's Name.*",
+        ]
+    ),
+    re.IGNORECASE,
+)
+
+
+# Transaction types whose description is replaced with a fixed label.
+_MBB_DEBIT_DESCRIPTION_OVERRIDES = {
+    "CASH WITHDRAWAL": "CASH WITHDRAWAL",
+    "DEBIT ADVICE": "Card Annual Fee",
+    "PROFIT PAID": "PROFIT PAID",
+}
+
+
+# Checked in order, so the first listed type found in a row wins (e.g. "RFLX" before
+# "RFLX INSTANT TRF DR").
+RHB_TRANSACTION_TYPES = [
+    "DUITNOW QR POS CR",
+    "INWARD IBG",
+    "RFLX",
+    "DUITNOW",
+    "RPP INWARD INST TRF",
+    "LOCAL CHQ",
+    "REFLEX-FUNDS TFR DR",
+    "MB FUND",
+    "CASH DEPOSIT",
+    "RPP INWARD",
+    "REFLEX-FUNDS TFR",
+    "REFLEX- FUNDS TFR DR",
+    "RFLX INSTANT TRF DR",
+    "RFLX INSTANT TRF SC",
+]
+
+
+def _read_pdf_lines(pdf_bytes: bytes) -> list[str]:
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
         if doc.needs_pass:
@@ -32,178 +115,181 @@ def _read_pdf_text(pdf_bytes: bytes) -> str:
                     "PDF is password-protected. Download the statement directly from the banking app/portal (not email attachment)."
                 )
 
-        text = "".join(page.get_text() for page in doc)
-        if len(text.strip()) < 20:
+        # Split page by page and stitch the boundary lines, which yields the
+        # same lines as joining the whole document and splitting it again.
+        lines: list[str] = []
+        for page in doc:
+            page_lines = page.get_text().split("\n")
+            if lines:
+                lines[-1] += page_lines[0]
+                lines.extend(page_lines[1:])
+            else:
+                lines = page_lines
+
+        if len("\n".join(lines).strip()) < 20:
             raise ValueError(
                 "PDF has no extractable text (likely scanned/image-only or protected). Use a text-based statement PDF from the bank app."
             )
-        return text
+        return lines
     finally:
         doc.close()
 
 
-def _remove_sections(lines: list[str], start_marker: str, end_marker: str) -> list[str]:
+def _filter_lines(lines: list[str], sections: list[tuple[str, str]], noise: re.Pattern[str]) -> list[str]:
+    """Drop marked sections and noise lines in a single pass.
+
+    Sections are applied in order, each one only seeing the lines that earlier
+    sections kept, exactly as if they were removed in separate passes.
+    """
     new_lines: list[str] = []
-    in_section = False
+    in_section = [False] * len(sections)
     for line in lines:
-        if start_marker in line:
-            in_section = True
-            continue
-        if end_marker in line:
-            in_section = False
-            continue
-        if not in_section:
+        keep = True
+        for k, (start_marker, end_marker) in enumerate(sections):
+            if start_marker in line:
+                in_section[k] = True
+                keep = False
+                break
+            if end_marker in line:
+                in_section[k] = False
+                keep = False
+                break
+            if in_section[k]:
+                keep = False
+                break
+        if keep and not noise.search(line):
             new_lines.append(line)
     return new_lines
 
 
-def _determine_flow(transaction_amount: str) -> str:
-    if transaction_amount.endswith("+"):
-        return "deposit"
-    if transaction_amount.endswith("-"):
-        return "withdrawal"
-    return "unknown"
-
-
-def _parse_m2u_debit(pdf_bytes: bytes, filename: str) -> pd.DataFrame:
-    text = _read_pdf_text(pdf_bytes)
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
+def _parse_m2u_debit(pdf_bytes: bytes, filename: str) -> dict[str, list[object]]:
+    lines = [line.strip() for line in _read_pdf_lines(pdf_bytes) if line.strip()]
 
+    # Prefer a date within five lines of "STATEMENT DATE", else the first date in
+    # the document, else the filename, all decided in one pass over the lines.
     year_statement = None
-    date_pattern = re.compile(r"\d{2}/\d{2}/\d{2}")
-
+    statement_date_index = None
     for i, line in enumerate(lines):
-        if "STATEMENT DATE" in line:
-            for j in range(i, min(i + 5, len(lines))):
-                match = date_pattern.search(lines[j])
-                if match:
-                    year_statement = match.group(0).split("/")[-1]
-                    break
-            break
-
-    if not year_statement:
-        for line in lines:
-            match = date_pattern.search(line)
-            if match:
-                year_statement = match.group(0).split("/")[-1]
+        if statement_date_index is None and "STATEMENT DATE" in line:
+            statement_date_index = i
+        in_window = statement_date_index is not None and i < statement_date_index + 5
+        match = _DATE_DDMMYY.search(line)
+        if match and (in_window or year_statement is None):
+            year_statement = match.group(0).split("/")[-1]
+            if in_window:
                 break
+        if year_statement and statement_date_index is not None and not in_window:
+            break
 
     if not year_statement:
-        match = re.search(r"(\d{4})(?=\d{2})", filename)
+        match = _FILENAME_YEAR.search(filename)
         if match:
             year_statement = match.group(1)[2:]
 
     if not year_statement:
         raise ValueError("Could not find statement year")
 
-    lines = _remove_sections(lines, "Malayan Banking Berhad (3813-K)", "denoted by DR")
-    lines = _remove_sections(lines, "FCN", "PLEASE BE INFORMED TO CHECK YOUR BANK ACCOUNT BALANCES REGULARLY")
-    lines = _remove_sections(lines, "ENTRY DATE", "STATEMENT BALANCE")
-    lines = _remove_sections(lines, "ENDING BALANCE :", "TOTAL CREDIT :")
-
-    strings_to_remove = [
-        "URUSNIAGA AKAUN/",
-        "戶口進支項",
-        "/ACCOUNT TRANSACTIONS",
-        "TARIKH MASUK",
-        "TARIKH NILAI",
-        "BUTIR URUSNIAGA",
-        "JUMLAH URUSNIAGA",
-        "BAKI PENYATA",
-        "進支日期",
-        "仄過賬日期",
-        "進支項說明",
-        "银碼",
-        "結單存餘",
-        "BEGINNING BALANCE",
-    ]
-
-    filtered_lines = [line for line in lines if not any(s in line for s in strings_to_remove)]
-
-    date_pattern = re.compile(r"\d{2}/\d{2}")
-    amount_pattern = re.compile(r"(\d{1,3}(?:,\d{3})*(?:\.\d{2})?(?:[+-])?|\d+(?:\.\d{2})?(?:[+-])?)")
-    structured_data: list[dict[str, object]] = []
-    current_entry: dict[str, object] | None = None
+    filtered_lines = _filter_lines(
+        lines,
+        [
+            ("Malayan Banking Berhad (3813-K)", "denoted by DR"),
+            ("FCN", "PLEASE BE INFORMED TO CHECK YOUR BANK ACCOUNT BALANCES REGULARLY"),
+            ("ENTRY DATE", "STATEMENT BALANCE"),
+            ("ENDING BALANCE :", "TOTAL CREDIT :"),
+        ],
+        _M2U_REMOVE_RE,
+    )
+
+    entry_dates: list[str | None] = []
+    descriptions: list[str] = []
+    amounts: list[str | None] = []
+    balances: list[str | None] = []
+    entry_date: str | None = None
+    entry_amount: str | None = None
+    entry_balance: str | None = None
     description_lines: list[str] = []
 
     for line in filtered_lines:
         line = line.strip()
-        if date_pattern.match(line):
-            if current_entry and description_lines:
-                current_entry["Transaction Description"] = " ".join(description_lines).strip()
-                structured_data.append(current_entry)
-            current_entry = {
-                "Entry Date": line,
-                "Transaction Description": "",
-                "Transaction Amount": None,
-                "Statement Balance": None,
-            }
+        if _DATE_DDMM.match(line):
+            if entry_date is not None and description_lines:
+                entry_dates.append(entry_date)
+                descriptions.append(" ".join(description_lines).strip())
+                amounts.append(entry_amount)
+                balances.append(entry_balance)
+            entry_date = line
+            entry_amount = None
+            entry_balance = None
             description_lines = []
             continue
 
-        if not current_entry:
+        if entry_date is None:
             continue
 
-        amounts = amount_pattern.findall(line)
-        is_amount = bool(amounts and any(amt.replace(",", "").replace(".", "").replace("+", "").replace("-", "").isdigit() for amt in amounts))
-        if is_amount:
-            amount_str = amounts[0]
-            if ("+" in line or "-" in line) and not current_entry["Transaction Amount"]:
-                current_entry["Transaction Amount"] = amount_str
+        amount_match = _AMOUNT_RE.search(line)
+        if amount_match:
+            amount_str = amount_match.group(1)
+            if ("+" in line or "-" in line) and not entry_amount:
+                entry_amount = amount_str
                 continue
-            if current_entry["Transaction Amount"] and not current_entry["Statement Balance"]:
-                current_entry["Statement Balance"] = amount_str
+            if entry_amount and not entry_balance:
+                entry_balance = amount_str
                 continue
 
         description_lines.append(line)
 
-    if current_entry and description_lines:
-        current_entry["Transaction Description"] = " ".join(description_lines).strip()
-        structured_data.append(current_entry)
+    if entry_date is not None and description_lines:
+        entry_dates.append(entry_date)
+        descriptions.append(" ".join(description_lines).strip())
+        amounts.append(entry_amount)
+        balances.append(entry_balance)
 
-    df = pd.DataFrame(structured_data)
-    if df.empty:
+    if not entry_dates:
         raise ValueError("No transactions were extracted from the PDF")
 
-    def parse_entry_date(raw: object) -> pd.Timestamp:
-        text = str(raw).strip()
-        if re.fullmatch(r"\d{2}/\d{2}/\d{2}", text):
-            return pd.to_datetime(text, format="%d/%m/%y", dayfirst=True)
-        if re.fullmatch(r"\d{2}/\d{2}", text):
-            return pd.to_datetime(f"{text}/{year_statement}", format="%d/%m/%y", dayfirst=True)
-        return pd.NaT
+    # Resolve the statement year here, while it is still known per file.
+    for k, raw_date in enumerate(entry_dates):
+        if _DATE_DDMM.fullmatch(raw_date):
+            entry_dates[k] = f"{raw_date}/{year_statement}"
+        elif not _DATE_DDMMYY.fullmatch(raw_date):
+            entry_dates[k] = None
+
+    return {
+        "Entry Date": entry_dates,
+        "Transaction Description": descriptions,
+        "Transaction Amount": amounts,
+        "Statement Balance": balances,
+    }
 
-    df["Entry Date"] = df["Entry Date"].apply(parse_entry_date)
+
+def _finalize_m2u_debit(df: pd.DataFrame) -> pd.DataFrame:
+    df["Entry Date"] = pd.to_datetime(df["Entry Date"], format="%d/%m/%y")
     df = df.dropna(subset=["Entry Date"])
 
-    def clean_amount(val: object) -> str | None:
-        if pd.isna(val) or val in (None, ""):
-            return None
-        clean_val = re.sub(r"[^\d.,+-]", "", str(val))
-        return clean_val or None
-
-    df["Transaction Amount"] = df["Transaction Amount"].apply(clean_amount)
-    df["Statement Balance"] = df["Statement Balance"].apply(clean_amount)
-    df["flow"] = df["Transaction Amount"].apply(lambda x: "inflow" if x and "+" in str(x) else "outflow" if x else None)
-    df["Transaction Amount"] = df["Transaction Amount"].apply(lambda x: float(re.sub(r"[^\d.]", "", str(x))) if x else None)
-    df["Statement Balance"] = df["Statement Balance"].apply(lambda x: float(re.sub(r"[^\d.]", "", str(x))) if x else None)
+    amount = df["Transaction Amount"].astype("string").str.replace(_CLEAN_AMOUNT_RE, "", regex=True).replace("", pd.NA)
+    balance = df["Statement Balance"].astype("string").str.replace(_CLEAN_AMOUNT_RE, "", regex=True).replace("", pd.NA)
+    df["flow"] = np.where(amount.str.contains("+", regex=False, na=False), "inflow", np.where(amount.notna(), "outflow", None))
+    df["Transaction Amount"] = pd.to_numeric(amount.str.replace(_NON_DIGIT_DOT, "", regex=True), errors="coerce").astype(float)
+    df["Statement Balance"] = pd.to_numeric(balance.str.replace(_NON_DIGIT_DOT, "", regex=True), errors="coerce").astype(float)
     return df.dropna(subset=["Transaction Amount"])
 
 
-def _parse_maybank_credit(pdf_bytes: bytes, filename: str) -> pd.DataFrame:
-    text = _read_pdf_text(pdf_bytes)
+def _parse_maybank_credit(pdf_bytes: bytes, filename: str) -> dict[str, list[object]]:
+    lines = _read_pdf_lines(pdf_bytes)
     year = None
-    for candidate in re.findall(r"\d{4}", filename):
+    for candidate in _FOUR_DIGITS.findall(filename):
         if 2010 < int(candidate) < 2050:
             year = candidate
             break
     if not year:
         year = str(pd.Timestamp.now().year)
 
-    lines = text.split("\n")
-    data = [line for line in lines if not any(s in line for s in COMMON_STRINGS_TO_REMOVE)]
+    data = _filter_lines(lines, [], _REMOVE_RE)
 
-    final_structured_data: list[list[str]] = []
+    posting_dates: list[str] = []
+    transaction_dates: list[str] = []
+    descriptions: list[str] = []
+    amounts: list[str] = []
     i = 0
     while i < len(data):
         if i + 1 < len(data) and "/" in data[i] and len(data[i]) == 5 and "/" in data[i + 1] and len(data[i + 1]) == 5:
@@ -215,7 +301,7 @@ def _parse_maybank_credit(pdf_bytes: bytes, filename: str) -> pd.DataFrame:
             amount = ""
             while i < len(data) and not ("/" in data[i] and len(data[i]) == 5):
                 clean_line = data[i].strip()
-                amount_match = re.match(r"^(\d{1,3}(?:,\d{3})*(\.\d{2})?)(CR)?$", clean_line, re.IGNORECASE)
+                amount_match = _MBB_CREDIT_AMOUNT.match(clean_line)
                 if amount_match:
                     amount = amount_match.group(1)
                     if amount_match.group(3):
@@ -225,59 +311,96 @@ def _parse_maybank_credit(pdf_bytes: bytes, filename: str) -> pd.DataFrame:
                 description.append(clean_line)
                 i += 1
 
-            final_structured_data.append([posting_date, transaction_date, ", ".join(description), amount, year])
+            posting_dates.append(posting_date)
+            transaction_dates.append(transaction_date)
+            descriptions.append(", ".join(description))
+            amounts.append(amount)
         else:
             i += 1
 
-    if not final_structured_data:
+    if not posting_dates:
         raise ValueError("No Maybank credit transactions extracted")
 
-    df = pd.DataFrame(final_structured_data, columns=["Posting Date", "Transaction Date", "Transaction Description", "Amount", "Year"])
+    return {
+        "Posting Date": posting_dates,
+        "Transaction Date": transaction_dates,
+        "Transaction Description": descriptions,
+        "Amount": amounts,
+        "Year": [year] * len(posting_dates),
+    }
+
+
+def _finalize_maybank_credit(df: pd.DataFrame) -> pd.DataFrame:
     df["Amount"] = df["Amount"].str.replace(",", "").replace("", None).astype(float)
     df["Year"] = df["Year"].astype("Int64")
     return df[["Year", "Posting Date", "Transaction Date", "Transaction Description", "Amount"]]
 
 
-def _parse_maybank_debit(pdf_bytes: bytes, _: str) -> pd.DataFrame:
-    text = _read_pdf_text(pdf_bytes)
-    lines = text.split("\n")
-    lines = _remove_sections(lines, "Maybank Islamic Berhad", "Please notify us of any change of address in writing.")
-    lines = _remove_sections(lines, "15th Floor, Tower A, Dataran Maybank, 1, Jalan Maarof, 59000 Kuala Lumpur", "請通知本行在何地址更换。")
-    lines = _remove_sections(lines, "ENTRY DATE", "STATEMENT BALANCE")
-    lines = _remove_sections(lines, "ENDING BALANCE :", "TOTAL DEBIT :")
-
-    transactions = [line for line in lines if not any(s in line for s in COMMON_STRINGS_TO_REMOVE)]
-    structured_data: list[dict[str, str]] = []
-    temp_entry: dict[str, str] = {}
-    date_pattern = re.compile(r"\d{2}/\d{2}/\d{2}")
+def _parse_maybank_debit(pdf_bytes: bytes, _: str) -> dict[str, list[object]]:
+    transactions = _filter_lines(
+        _read_pdf_lines(pdf_bytes),
+        [
+            ("Maybank Islamic Berhad", "Please notify us of any change of address in writing."),
+            ("15th Floor, Tower A, Dataran Maybank, 1, Jalan Maarof, 59000 Kuala Lumpur", "請通知本行在何地址更换。"),
+            ("ENTRY DATE", "STATEMENT BALANCE"),
+            ("ENDING BALANCE :", "TOTAL DEBIT :"),
+        ],
+        _REMOVE_RE,
+    )
+    # "Transaction Amount" holds the transaction type and "Statement Balance" the
+    # amount until the columns are renamed in _finalize_maybank_debit. Lines seen
+    # before the first date (e.g. BEGINNING BALANCE) form an entry without a date.
+    entry_dates: list[str | None] = []
+    descriptions: list[str] = []
+    types: list[str | None] = []
+    amounts: list[str | None] = []
+    has_entry = False
+    entry_date: str | None = None
+    entry_type: str | None = None
+    entry_amount: str | None = None
+    description_parts: list[str] = []
 
     for line in transactions:
-        if date_pattern.match(line):
-            if temp_entry:
-                structured_data.append(temp_entry)
-            temp_entry = {"Entry Date": line, "Transaction Description": "", "Transaction Amount": "", "Statement Balance": ""}
-        elif temp_entry.get("Transaction Amount") and temp_entry.get("Statement Balance", "") == "":
-            temp_entry["Statement Balance"] = line.strip()
-        elif temp_entry.get("Transaction Amount", "") == "":
-            temp_entry["Transaction Amount"] = line.strip()
-        elif temp_entry:
-            temp_entry["Transaction Description"] += line.strip() + ", "
-
-    if temp_entry:
-        structured_data.append(temp_entry)
-
-    for entry in structured_data:
-        entry["Transaction Description"] = str(entry.get("Transaction Description", "")).rstrip(", ")
-
-    df = pd.DataFrame(structured_data)
-    if df.empty:
+        if _DATE_DDMMYY.match(line):
+            if has_entry:
+                entry_dates.append(entry_date)
+                descriptions.append(", ".join(description_parts).rstrip(", "))
+                types.append(entry_type)
+                amounts.append(entry_amount)
+            has_entry = True
+            entry_date = line
+            entry_type = ""
+            entry_amount = ""
+            description_parts = []
+        elif entry_type and not entry_amount:
+            entry_amount = line.strip()
+        elif not entry_type:
+            entry_type = line.strip()
+            has_entry = True
+        elif has_entry:
+            description_parts.append(line.strip())
+
+    if has_entry:
+        entry_dates.append(entry_date)
+        descriptions.append(", ".join(description_parts).rstrip(", "))
+        types.append(entry_type)
+        amounts.append(entry_amount)
+
+    if not entry_dates:
         raise ValueError("No Maybank debit transactions extracted")
 
-    required_columns = ["Entry Date", "Transaction Amount", "Transaction Description", "Statement Balance"]
-    for column in required_columns:
-        if column not in df.columns:
-            df[column] = ""
+    return {
+        "Entry Date": entry_dates,
+        "Transaction Description": descriptions,
+        "Transaction Amount": types,
+        "Statement Balance": amounts,
+    }
+
 
+def _finalize_maybank_debit(df: pd.DataFrame) -> pd.DataFrame:
+    # Only an entry built from lines before the first date can lack an amount;
+    # such a row carries no transaction, so drop it rather than emit a null amount.
+    df = df.dropna(subset=["Statement Balance"]).copy()
     df["Entry Date"] = pd.to_datetime(df["Entry Date"], format="%d/%m/%y", dayfirst=True).dt.date
     df["Transaction Description"] = df["Transaction Description"].fillna("").astype(str)
     df["Statement Balance 2"] = df["Transaction Description"].str.extract(r"(\d+,\d+\.\d+)")[0]
@@ -287,25 +410,26 @@ def _parse_maybank_debit(pdf_bytes: bytes, _: str) -> pd.DataFrame:
 
     df = df[["Entry Date", "Transaction Amount", "Transaction Description", "Statement Balance", "Statement Balance 2"]]
     df = df.rename(columns={"Transaction Amount": "Transaction Type", "Statement Balance": "Transaction Amount", "Statement Balance 2": "Statement_Balance"})
-    df.loc[df["Transaction Type"] == "CASH WITHDRAWAL", "Transaction Description"] = "CASH WITHDRAWAL"
-    df.loc[df["Transaction Type"] == "DEBIT ADVICE", "Transaction Description"] = "Card Annual Fee"
-    df.loc[df["Transaction Type"] == "PROFIT PAID", "Transaction Description"] = "PROFIT PAID"
-    df["flow"] = df["Transaction Amount"].apply(_determine_flow)
+    overrides = df["Transaction Type"].map(_MBB_DEBIT_DESCRIPTION_OVERRIDES)
+    df["Transaction Description"] = overrides.fillna(df["Transaction Description"])
+    sign = df["Transaction Amount"].str[-1]
+    df["flow"] = np.select([sign.eq("+"), sign.eq("-")], ["deposit", "withdrawal"], default="unknown")
     df["Transaction Amount"] = df["Transaction Amount"].str.replace("+", "", regex=False).str.replace("-", "", regex=False)
     df["Transaction Amount"] = df["Transaction Amount"].str.replace(",", "").astype(float)
     return df
 
 
 def _remove_close_dates(data: list[str]) -> list[str]:
-    valid_dates_indices: list[int] = []
+    valid_dates_indices: set[int] = set()
+    is_date = [_DATE_DDMMYYYY.match(line) is not None for line in data]
     i = 0
     while i < len(data):
-        if re.match(r"\d{2}/\d{2}/\d{4}", data[i]):
-            valid_dates_indices.append(i)
+        if is_date[i]:
+            valid_dates_indices.add(i)
             i += 4
         else:
             i += 1
-    return [data[idx] for idx in range(len(data)) if idx in valid_dates_indices or not re.match(r"\d{2}/\d{2}/\d{4}", data[idx])]
+    return [line for idx, line in enumerate(data) if idx in valid_dates_indices or not is_date[idx]]
 
 
 def _is_pure_number(s: str) -> bool:
@@ -313,69 +437,76 @@ def _is_pure_number(s: str) -> bool:
     return s.isnumeric() and not any(c in s for c in ".,")
 
 
-def _parse_cimb_debit(pdf_bytes: bytes, _: str) -> pd.DataFrame:
-    text = _read_pdf_text(pdf_bytes)
-    lines = text.split("\n")
-    lines = _remove_sections(lines, "Page / Halaman", "ISLAMIC BBB-PPPP")
-
-    filtered_lines = [line for line in lines if not any(s in line for s in COMMON_STRINGS_TO_REMOVE)]
+def _parse_cimb_debit(pdf_bytes: bytes, _: str) -> dict[str, list[object]]:
+    filtered_lines = _filter_lines(_read_pdf_lines(pdf_bytes), [("Page / Halaman", "ISLAMIC BBB-PPPP")], _REMOVE_RE)
     data = _remove_close_dates(filtered_lines)
     data = [item for item in data if not _is_pure_number(item)]
     data = [item if item != "99 SPEEDMART-2133" else "ninetynine speed mart" for item in data]
 
-    final_structured_data: list[dict[str, str]] = []
+    dates: list[str] = []
+    type_descriptions: list[str] = []
+    amounts: list[str | None] = []
+    balances: list[str] = []
+    payees: list[str] = []
     i = 0
     while i < len(data):
-        transaction: dict[str, str] = {}
         if data[i] == "OPENING BALANCE":
-            transaction["Date"] = "-"
-            transaction["Transaction Type/Description"] = "Opening Balance"
             i += 1
-            transaction["Balance After Transaction"] = "-"
-            transaction["Amount"] = data[i].strip()
-            transaction["Beneficiary/Payee Name"] = "-"
-            final_structured_data.append(transaction)
+            dates.append("-")
+            type_descriptions.append("Opening Balance")
+            amounts.append(data[i].strip())
+            balances.append("-")
+            payees.append("-")
             i += 1
             continue
 
-        if re.match(r"\d{2}/\d{2}/\d{4}", data[i]):
-            transaction["Date"] = data[i]
+        if _DATE_DDMMYYYY.match(data[i]):
+            dates.append(data[i])
             i += 1
             description_lines: list[str] = []
-            while i < len(data) and not re.match(r"\d{2}/\d{2}/\d{4}", data[i]) and not re.match(r"^-?\d", data[i].strip()):
+            while i < len(data) and not _DATE_DDMMYYYY.match(data[i]) and not _LEADING_NUMBER.match(data[i].strip()):
                 if data[i].strip():
                     description_lines.append(data[i].strip())
                 i += 1
 
-            transaction["Transaction Type/Description"] = ", ".join(description_lines)
-            if i < len(data) and re.match(r"^-?\d", data[i].strip()):
-                transaction["Amount"] = data[i].strip()
+            type_descriptions.append(", ".join(description_lines))
+            if i < len(data) and _LEADING_NUMBER.match(data[i].strip()):
+                amounts.append(data[i].strip())
                 i += 1
+            else:
+                amounts.append(None)
 
             balance_line = data[i].strip() if i < len(data) else ""
             while not balance_line and i < len(data):
                 i += 1
                 balance_line = data[i].strip() if i < len(data) else ""
 
-            transaction["Balance After Transaction"] = balance_line
-            transaction["Beneficiary/Payee Name"] = description_lines[0] if description_lines else "-"
-            final_structured_data.append(transaction)
+            balances.append(balance_line)
+            payees.append(description_lines[0] if description_lines else "-")
             continue
 
         i += 1
 
-    if not final_structured_data:
+    if not dates:
         raise ValueError("No CIMB debit transactions extracted")
 
-    df = pd.DataFrame(final_structured_data)
+    return {
+        "Date": dates,
+        "Transaction Type/Description": type_descriptions,
+        "Amount": amounts,
+        "Balance After Transaction": balances,
+        "Beneficiary/Payee Name": payees,
+    }
+
+
+def _finalize_cimb_debit(df: pd.DataFrame) -> pd.DataFrame:
     df["Transaction Description2"] = df["Transaction Type/Description"].apply(lambda x: " ".join(x.split()[1:]))
     df["Transaction Description"] = df["Transaction Description2"] + ", " + df["Beneficiary/Payee Name"]
     df.drop(columns=["Transaction Type/Description", "Beneficiary/Payee Name"], inplace=True)
 
-    for i in range(1, len(df)):
-        prev_balance = pd.to_numeric(df.loc[i - 1, "Balance After Transaction"], errors="coerce")
-        curr_balance = pd.to_numeric(df.loc[i, "Balance After Transaction"], errors="coerce")
-        df.loc[i, "output"] = "deposit" if curr_balance > prev_balance else "withdrawal"
+    balance = pd.to_numeric(df["Balance After Transaction"], errors="coerce").to_numpy()
+    output = np.where(balance[1:] > balance[:-1], "deposit", "withdrawal").astype(object)
+    df["output"] = np.concatenate(([np.nan], output))
 
     df["Transaction Description2"] = df["Transaction Description2"].replace("Balance", "Opening Balance")
     df["Transaction Description"] = df["Transaction Description"].replace("Balance, -", "Opening Balance")
@@ -383,14 +514,13 @@ def _parse_cimb_debit(pdf_bytes: bytes, _: str) -> pd.DataFrame:
     return df[["Date", "Transaction Type", "Transaction Description", "Transaction Description2", "Amount", "Balance After Transaction", "output"]]
 
 
-def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
-    text = _read_pdf_text(pdf_bytes)
+def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> dict[str, list[object]]:
     transactions: list[dict[str, object]] = []
     current_transaction: dict[str, object] | None = None
 
-    for raw_line in text.split("\n"):
+    for raw_line in _read_pdf_lines(pdf_bytes):
         line = raw_line.strip()
-        date_match = re.match(r"(\d{2}-\d{2}-\d{4}|\d{2}-\d{2}-\d{2})", line)
+        date_match = _RHB_DATE.match(line)
         if date_match:
             if current_transaction is not None:
                 transactions.append(current_transaction)
@@ -401,23 +531,11 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
     if current_transaction is not None:
         transactions.append(current_transaction)
 
-    rows: list[dict[str, str]] = []
-    transaction_types = [
-        "DUITNOW QR POS CR",
-        "INWARD IBG",
-        "RFLX",
-        "DUITNOW",
-        "RPP INWARD INST TRF",
-        "LOCAL CHQ",
-        "REFLEX-FUNDS TFR DR",
-        "MB FUND",
-        "CASH DEPOSIT",
-        "RPP INWARD",
-        "REFLEX-FUNDS TFR",
-        "REFLEX- FUNDS TFR DR",
-        "RFLX INSTANT TRF DR",
-        "RFLX INSTANT TRF SC",
-    ]
+    dates: list[str] = []
+    descriptions: list[str] = []
+    senders: list[str] = []
+    amounts_dr: list[str] = []
+    amounts_cr: list[str] = []
 
     for txn in transactions:
         combined_text = " ".join(txn["Lines"]).strip()
@@ -425,7 +543,7 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
         amount_dr = ""
         amount_cr = ""
 
-        amount_match = re.search(r"([\d,]+\.\d{2})\s*(DR|CR|\+|\-)?$", combined_text)
+        amount_match = _RHB_AMOUNT.search(combined_text)
         if amount_match:
             amount = amount_match.group(1).replace(",", "")
             sign = amount_match.group(2)
@@ -435,26 +553,31 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
                 amount_cr = amount
             combined_text = combined_text[: amount_match.start()].strip()
 
-        for t_type in transaction_types:
+        for t_type in RHB_TRANSACTION_TYPES:
             if t_type in combined_text:
                 description = t_type
                 combined_text = combined_text.replace(description, "").strip()
                 break
 
-        rows.append(
-            {
-                "Date": txn["Date"],
-                "Description": description,
-                "Sender/Beneficiary": combined_text,
-                "Amount (DR)": amount_dr,
-                "Amount (CR)": amount_cr,
-            }
-        )
-
-    if not rows:
+        dates.append(txn["Date"])
+        descriptions.append(description)
+        senders.append(combined_text)
+        amounts_dr.append(amount_dr)
+        amounts_cr.append(amount_cr)
+
+    if not dates:
         raise ValueError("No RHB Flex transactions extracted")
 
-    df = pd.DataFrame(rows)
+    return {
+        "Date": dates,
+        "Description": descriptions,
+        "Sender/Beneficiary": senders,
+        "Amount (DR)": amounts_dr,
+        "Amount (CR)": amounts_cr,
+    }
+
+
+def _finalize_rhb_flex(df: pd.DataFrame) -> pd.DataFrame:
     df["Date"] = pd.to_datetime(df["Date"], format="%d-%m-%Y", errors="coerce").fillna(pd.to_datetime(df["Date"], format="%d-%m-%y", errors="coerce"))
     df["Date"] = df["Date"].dt.strftime("%d-%m-%y")
 
@@ -463,7 +586,7 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
         balance = ""
         new_sender_beneficiary = s
         recipient_reference = ""
-        match = re.match(r"^([\d,]+\.\d{2}\+)\s*(.*)", s)
+        match = _RHB_BALANCE.match(s)
         if not match:
             return pd.Series([balance, new_sender_beneficiary, recipient_reference])
 
@@ -475,31 +598,16 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
 
         cleaned_tokens: list[str] = []
         for token in recipient_reference.split():
-            if len(token) >= 8 and re.search(r"[A-Za-z]", token) and re.search(r"\d", token):
+            if len(token) >= 8 and _HAS_LETTER.search(token) and _HAS_DIGIT.search(token):
                 continue
-            if re.match(r"^\d{3}$", token):
+            if _THREE_DIGITS.match(token):
                 continue
-            if re.match(r"^\d{8,}$", token):
+            if _LONG_DIGITS.match(token):
                 continue
             cleaned_tokens.append(token)
         recipient_reference = " ".join(cleaned_tokens)
 
-        unwanted_patterns = [
-            r"06/\s*\d+\s*/\s*-\s*",
-            r"/\s*\d{3,}\s*/\s*-\s*",
-            r"www\.rhbgroup\.com.*",
-            r"For Any Enquiries.*",
-            r"Date Branch Description.*",
-            r"Reference 1 / Recipient's Reference.*",
-            r"Reference 2 / Other Payment Details.*",
-            r"RefNum.*",
-            r"Amount \(DR\).*",
-            r"Amount \(CR\).*",
-            r"Balance Sender's / Beneficiary's Name.*",
-            r"Sender's / Beneficiary's Name.*",
-        ]
-        for pattern in unwanted_patterns:
-            recipient_reference = re.sub(pattern, "", recipient_reference, flags=re.IGNORECASE)
+        recipient_reference = _UNWANTED_UNION.sub("", recipient_reference)
         recipient_reference = " ".join(recipient_reference.split())
         return pd.Series([balance, new_sender_beneficiary, recipient_reference])
 
@@ -510,10 +618,23 @@ def _parse_rhb_flex(pdf_bytes: bytes, _: str) -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 
-MODE_HANDLERS: dict[str, Callable[[bytes, str], pd.DataFrame]] = {
+MODE_HANDLERS: dict[str, Callable[[bytes, str], dict[str, list[object]]]] = {
     "maybank_debit": _parse_maybank_debit,
     "maybank_credit": _parse_maybank_credit,
     "cimb_debit": _parse_cimb_debit,
     "m2u_current_account_debit": _parse_m2u_debit,
     "rhb_flex": _parse_rhb_flex,
 }
+
+MODE_FINALIZERS: dict[str, Callable[[pd.DataFrame], pd.DataFrame]] = {
+    "maybank_debit": _finalize_maybank_debit,
+    "maybank_credit": _finalize_maybank_credit,
+    "cimb_debit": _finalize_cimb_debit,
+    "m2u_current_account_debit": _finalize_m2u_debit,
+    "rhb_flex": _finalize_rhb_flex,
+}
+
+
+def parse_statement(mode: str, pdf_bytes: bytes, filename: str) -> pd.DataFrame:
+    """Parse and finalize one statement PDF, so its errors stay tied to that file."""
+    return MODE_FINALIZERS[mode](pd.DataFrame(MODE_HANDLERS[mode](pdf_bytes, filename)))
@@ -1,15 +1,68 @@
-from datetime import date, datetime
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Any
 
 import pandas as pd
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 
-from api_parser import MODE_HANDLERS
+from api_parser import MODE_HANDLERS, parse_statement
 
 
-app = FastAPI(title="MAE PDF Processing API", version="1.0.0")
+PARSE_CACHE_SIZE = 256
+CSV_CHUNK_ROWS = 10_000
+_parse_cache: OrderedDict[tuple[str, str, bytes], pd.DataFrame] = OrderedDict()
+_parse_pool: ProcessPoolExecutor | None = None
+
+
+def _parse_worker_count() -> int:
+    # Each worker holds its own pandas and PyMuPDF, so stay small on the 512 MB
+    # instance. os.cpu_count() reports the host's CPUs inside a container, so use
+    # the CPUs this process may actually run on.
+    configured = os.environ.get("PARSE_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return min(2, available)
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # The pool is created inside the running server, which already has
+        # threadpool workers, and forking a threaded process can deadlock.
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=_parse_worker_count(),
+            mp_context=multiprocessing.get_context(start_method),
+        )
+    return _parse_pool
+
+
+def _shutdown_parse_pool(pool: ProcessPoolExecutor) -> None:
+    global _parse_pool
+    pool.shutdown(wait=False, cancel_futures=True)
+    if _parse_pool is pool:
+        _parse_pool = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    if _parse_pool is not None:
+        _shutdown_parse_pool(_parse_pool)
+
+
+app = FastAPI(title="MAE PDF Processing API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +73,60 @@ app.add_middleware(
 )
 
 
+async def _parse_cached(mode: str, payload: bytes, filename: str) -> pd.DataFrame:
+    # The filename is part of the key because some parsers read the statement year from it.
+    key = (mode, filename, hashlib.blake2b(payload, digest_size=16).digest())
+    df = _parse_cache.get(key)
+    if df is not None:
+        _parse_cache.move_to_end(key)
+        return df
+
+    # Parsing and finalizing are CPU-bound, so run both in a worker process to keep the event loop free.
+    loop = asyncio.get_running_loop()
+    pool = _get_parse_pool()
+    try:
+        df = await loop.run_in_executor(pool, parse_statement, mode, payload, filename)
+    except BrokenProcessPool:
+        # A worker died (e.g. a crash inside PyMuPDF); start a fresh pool on the next request.
+        _shutdown_parse_pool(pool)
+        raise
+
+    _parse_cache[key] = df
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+    return df
+
+
+async def _parse_upload(mode: str, uploaded: UploadFile) -> pd.DataFrame:
+    filename = uploaded.filename or "uploaded.pdf"
+    if not filename.lower().endswith(".pdf"):
+        raise ValueError("Only PDF files are supported")
+
+    payload = await uploaded.read()
+    if not payload:
+        raise ValueError("File is empty")
+    return await _parse_cached(mode, payload, filename)
+
+
+def _iter_csv(df: pd.DataFrame) -> Iterator[str]:
+    for start in range(0, len(df), CSV_CHUNK_ROWS):
+        yield df.iloc[start : start + CSV_CHUNK_ROWS].to_csv(index=False, header=start == 0)
+
+
+def _json_rows(df: pd.DataFrame) -> list[dict[str, Any]]:
+    # Format dates per column and map missing values to None up front, so the
+    # records need no per-value conversion.
+    formatted: dict[str, pd.Series] = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            formatted[column] = series.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "date":
+            formatted[column] = pd.to_datetime(series).dt.strftime("%Y-%m-%d")
+    df = df.assign(**formatted)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
 @app.get("/")
 def root() -> dict[str, object]:
     return {"service": "mae-pdf-processing-api", "status": "ok", "health": "/health", "modes": "/modes", "process": "/process"}
@@ -53,49 +160,31 @@ async def process_pdfs(
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
 
-    parser = MODE_HANDLERS[mode]
     all_dataframes: list[pd.DataFrame] = []
     errors: list[dict[str, str]] = []
 
-    for uploaded in files:
+    # Results come back in upload order, so errors are reported in that order too.
+    results = await asyncio.gather(*(_parse_upload(mode, uploaded) for uploaded in files), return_exceptions=True)
+    for uploaded, result in zip(files, results):
         filename = uploaded.filename or "uploaded.pdf"
-        if not filename.lower().endswith(".pdf"):
-            errors.append({"file": filename, "error": "Only PDF files are supported"})
-            continue
-
-        payload = await uploaded.read()
-        if not payload:
-            errors.append({"file": filename, "error": "File is empty"})
-            continue
-
-        try:
-            df = parser(payload, filename)
-            if df is not None and not df.empty:
-                all_dataframes.append(df)
-            else:
-                errors.append({"file": filename, "error": "No rows extracted"})
-        except Exception as exc:
-            errors.append({"file": filename, "error": str(exc)})
+        if isinstance(result, BaseException):
+            errors.append({"file": filename, "error": str(result)})
+        elif not result.empty:
+            all_dataframes.append(result)
+        else:
+            errors.append({"file": filename, "error": "No rows extracted"})
 
     if not all_dataframes:
         return JSONResponse(status_code=422, content={"message": "No data extracted from uploaded PDFs.", "errors": errors})
 
-    combined_df = pd.concat(all_dataframes, ignore_index=True)
-    import_id = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    combined_df = all_dataframes[0] if len(all_dataframes) == 1 else pd.concat(all_dataframes, ignore_index=True)
 
-    def normalize_for_json(value: Any) -> Any:
-        if value is None or pd.isna(value):
-            return None
-        if isinstance(value, (datetime, date, pd.Timestamp)):
-            return value.isoformat()
-        return value
+    import_id = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
 
     if response_format == "json":
-        rows = []
-        for record in combined_df.to_dict(orient="records"):
-            rows.append({key: normalize_for_json(value) for key, value in record.items()})
+        rows = _json_rows(combined_df)
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "import_id": import_id,
                 "mode": mode,
@@ -105,10 +194,9 @@ async def process_pdfs(
             }
         )
 
-    csv_output = combined_df.to_csv(index=False)
     output_name = f"{mode}-{import_id}.csv"
 
     headers = {"Content-Disposition": f'attachment; filename="{output_name}"'}
     if errors:
         headers["X-Partial-Errors"] = str(len(errors))
-    return Response(content=csv_output, media_type="text/csv", headers=headers)
+    return StreamingResponse(_iter_csv(combined_df), media_type="text/csv", headers=headers)